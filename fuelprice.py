@@ -1,6 +1,7 @@
 #!/usr/bin/python3
 """Display petrol fuel prices.  Prices are obtained from a web service.
-   Requires requests package ('pip install --upgrade requests')
+   Requires requests package ('pip install --upgrade requests').
+   Uses lxml for faster XML parsing if it is installed (optional).
 
    The web service returns fuel price info in XML format. 
    Each fuel type is contained in an `<item>` element of the XML, containing: 
@@ -17,76 +18,234 @@
     </item>
     ```
 """
-import xml.dom, xml.dom.minidom
+import io
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from operator import attrgetter
+from typing import NamedTuple
 import requests
+try:
+    # lxml parses at C speed with the same Element API; use it if installed
+    from lxml import etree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
+
+# Precompiled patterns for the opt-in regex fast path in parse_data.
+# They only extract the tags this program actually uses.
+_ITEM_RE = re.compile(rb'<item>(.*?)</item>', re.S)
+_FIELD_RE = re.compile(rb'<(type|today|tomorrow|yesterday|unit_en)>([^<]*)</\1>')
+_DATE_RE = re.compile(rb'<update_date>([^<]*)</update_date>')
+
+# Bangchak brand words ("S", "EVO") to strip from fuel type names.
+# Matched only as whole words so e.g. "Super" is left alone.
+_STRIP_RE = re.compile(r'\s+(?:EVO|S)(?=\s|$)')
+
+
+class Fuel(NamedTuple):
+    """Price info for one type of fuel, from the web service data.
+    A named tuple is far more compact than a dict and field access
+    is a plain attribute load.  Prices are converted to float once
+    at parse time."""
+    type: str
+    today: float
+    tomorrow: float
+    yesterday: float
+    unit_en: str
+
+
+# Fuel fields holding prices, converted to float when parsed
+_PRICE_TAGS = ('today', 'tomorrow', 'yesterday')
+
+# Tags to keep from each <item>, as a frozenset for O(1) membership tests
+# (everything else -- image, image2, unit_th -- is skipped)
+_FUEL_FIELDS = frozenset(Fuel._fields)
 
 
 class FuelPrice:
     
     URL = "https://www.bangchak.co.th/api/oilprice"
 
+    # How long (seconds) to reuse a previous result before fetching again.
+    # Prices change at most once per day, so a short TTL is safe.
+    CACHE_TTL = 900
+
+    # When the cache is this close (seconds) to expiring, start refreshing
+    # it in the background so the next caller never waits on the network.
+    REFRESH_WINDOW = 60
+
+    # If True, parse_data first tries a regex scan of the raw bytes instead
+    # of building an XML tree.  Falls back to the XML parse if the data
+    # does not match the expected schema.
+    USE_FAST_PARSER = False
+
     # The publication date contained in the data returned by get_fuel_price()
     _publication_date = None
 
+    # Reusable HTTP session, created on first use.  Keeping the connection
+    # alive avoids a new TCP+TLS handshake on every request.
+    _session = None
+
+    # Cached result of the last fetch: (timestamp, fuels, date)
+    _cache = None
+
+    # Memoized sorted Gasohol-only view of the cached fuels
+    _sorted_gasohol = None
+
+    # Single worker for background cache refreshes (created on first use)
+    _executor = None
+    _refresh_future = None
+
     @classmethod
     def get_fuel_prices(cls):
         """Get petrol fuel prices using data from a web service.
         
         :returns: list of fuel price info. Each element is a
-             a dictionary of info for one type of fuel. 
-             Keys are the tags in the fuel data obtained from a web service.
+             Fuel named tuple of info for one type of fuel.
+             Fields are the tags in the fuel data obtained from a web service.
+             Results are cached for CACHE_TTL seconds to avoid redundant
+             requests to the web service.  When the cache is close to
+             expiring it is refreshed in the background, so callers see
+             a cached result instead of waiting on the network.
+        """
+        if cls._cache is not None:
+            timestamp, fuels, date = cls._cache
+            age = time.monotonic() - timestamp
+            if age < cls.CACHE_TTL:
+                if age >= cls.CACHE_TTL - cls.REFRESH_WINDOW:
+                    cls._prefetch()
+                cls._publication_date = date
+                return fuels
+        return cls._refresh()
+
+    @classmethod
+    def _refresh(cls):
+        """Fetch and parse fresh prices and refill the cache.
+
+        :returns: list of Fuel named tuples, or an empty list (leaving
+            the cache untouched) if the fetch failed.
         """
         data = cls.get_fuel_data()
         if not data:
             return []
-        return cls.parse_data(data)
-    
+        fuels = cls.parse_data(data)
+        # a single assignment, so readers never see a half-built cache
+        cls._cache = (time.monotonic(), fuels, cls._publication_date)
+        cls._sorted_gasohol = None  # view of the old data is now stale
+        return fuels
+
+    @classmethod
+    def _prefetch(cls):
+        """Kick off a cache refresh on the background worker, unless one
+        is already in flight."""
+        if cls._refresh_future is None or cls._refresh_future.done():
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(max_workers=1)
+            cls._refresh_future = cls._executor.submit(cls._refresh)
+
+    @classmethod
+    def get_gasohol_prices(cls):
+        """Get prices for Gasohol fuels only, sorted by fuel type.
+
+        The sorted view is memoized alongside the price cache, so repeated
+        calls do not refilter or resort the same data.
+
+        :returns: list of fuel price info for Gasohol fuels, in the same
+             form as get_fuel_prices, ordered by fuel type.
+        """
+        fuels = cls.get_fuel_prices()
+        if cls._sorted_gasohol is None:
+            cls._sorted_gasohol = sorted(
+                    (fuel for fuel in fuels if fuel.type.startswith('Gasohol')),
+                    key=attrgetter('type'))
+        return cls._sorted_gasohol
+
     @classmethod
     def get_fuel_data(cls):
         """Obtain petrol fuel prices from a web service.
         
         :returns: data from the web service in XML format or none if request fails.
         """
-        response = requests.get(cls.URL)
+        if cls._session is None:
+            cls._session = requests.Session()
+            cls._session.headers['Accept-Encoding'] = 'gzip'
+            cls._session.mount('https://',
+                    requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        response = cls._session.get(cls.URL, timeout=10)
         if response.status_code != 200:
             print(f"Response code {response.status_code} from {cls.URL}")
             return None
         return response.content
 
     @classmethod
-    def parse_data(cls, data: str):
+    def parse_data(cls, data: bytes):
         """Parse XML data containing fuel prices, using Bangchak's schema.
-    
-        :param data:  string containing XML format data for fuel prices.
-        :returns: list of dictionaries of fuel data. See get_fuel_prices
+
+        :param data:  bytes containing XML format data for fuel prices,
+            as returned by get_fuel_data.  The XML parser handles the
+            encoding declaration itself, so no decode step is needed.
+        :returns: list of Fuel named tuples. See get_fuel_prices
             for more detail.
             The fuel 'type' names are reformatted to remove Bangchak's brand
             names from fuels, e.g. remove "S" from "Gasohol 91 S", and
             remove "EVO" from some fuel names. Then convert names to title case.
         """
-        document = xml.dom.minidom.parseString(data)
-        # get the publication date
-        elements = document.getElementsByTagName("update_date")
-        # TODO Setting an attribute as a side-effect is bad design.
-        cls._publication_date = elements[0].firstChild.nodeValue
-        elements = document.getElementsByTagName("item")
+        if cls.USE_FAST_PARSER:
+            fuels = cls._parse_data_fast(data)
+            if fuels is not None:
+                return fuels
+        # stream the document so only one <item> is in memory at a time
         fuels = []
-        for element in elements:
-            # the child nodes are element.childNodes
-            fuel = {}
-            for node in element.childNodes:
-                tagName = node.tagName
-                if tagName in ['image','image2']: continue  # skip image URLs
-                fuel[node.tagName] = node.firstChild.nodeValue
-            # clean up the fuel name ('type' attribute)
-            if 'type' in fuel:
-                fueltype = fuel['type'].replace(' S ',' ').replace(' EVO','')
-                if fueltype.endswith(' S'):
-                    fueltype = fueltype[:-2]
-                fuel['type'] = fueltype.title()  # use title case
-            fuels.append(fuel)
+        for event, elem in ET.iterparse(io.BytesIO(data), events=('end',)):
+            if elem.tag == 'update_date':
+                # get the publication date
+                # TODO Setting an attribute as a side-effect is bad design.
+                cls._publication_date = elem.text
+            elif elem.tag == 'item':
+                # collect only the Fuel fields (skips image URLs, unit_th)
+                fuel = {node.tag: node.text for node in elem
+                        if node.tag in _FUEL_FIELDS}
+                for tag in _PRICE_TAGS:
+                    fuel[tag] = float(fuel[tag])
+                # clean up the fuel name ('type' is always present per schema)
+                fuel['type'] = cls._clean_type(fuel['type'])
+                fuels.append(Fuel(**fuel))
+                elem.clear()  # free the item's children once consumed
         return fuels
-    
+
+    @classmethod
+    def _parse_data_fast(cls, data: bytes):
+        """Extract fuel prices using precompiled regexes instead of an XML parse.
+
+        Only the tags this program uses are extracted, in a single C-level
+        scan of the raw bytes.
+
+        :param data: bytes containing XML format data for fuel prices.
+        :returns: list of Fuel named tuples, or None if the data does not
+            match the expected schema (caller should fall back to the
+            XML parser).
+        """
+        date = _DATE_RE.search(data)
+        if date is None:
+            return None
+        cls._publication_date = date.group(1).decode()
+        fuels = []
+        for match in _ITEM_RE.finditer(data):
+            fuel = {tag.decode(): value.decode()
+                    for tag, value in _FIELD_RE.findall(match.group(1))}
+            for tag in _PRICE_TAGS:
+                fuel[tag] = float(fuel[tag])
+            fuel['type'] = cls._clean_type(fuel['type'])
+            fuels.append(Fuel(**fuel))
+        return fuels or None
+
+    @staticmethod
+    def _clean_type(fueltype):
+        """Remove Bangchak's brand names ("S", "EVO") from a fuel type name
+        and convert it to title case."""
+        return _STRIP_RE.sub('', fueltype).title()
+
     @classmethod
     def get_date(cls):
         """Get the date of publication of the data. 
@@ -105,27 +264,26 @@ class FuelPrice:
 
 def print_fuel_prices(date, fuels):
     """Print the fuel names and prices in a useful format."""
-    print(f"{'Fuel Type':20}  Today        Tomorrow")
+    # build all the lines and write them in one call, instead of a
+    # print() (and possible flush) per row
+    lines = [f"{'Fuel Type':20}  Today        Tomorrow"]
     for fuel in fuels:
-        fueltype = fuel['type']
-        change = float(fuel['today']) - float(fuel['yesterday'])
-        print(f"{fueltype:20}  {fuel['today']:5} {change:+0.2f}  {fuel['tomorrow']:6} {fuel['unit_en']}")
-    print("Updated:", date)
+        change = fuel.today - fuel.yesterday
+        lines.append(f"{fuel.type:20}  {fuel.today:5.2f} {change:+0.2f}  {fuel.tomorrow:6.2f} {fuel.unit_en}")
+    lines.append(f"Updated: {date}")
+    sys.stdout.write('\n'.join(lines) + '\n')
 
 def print_daily_prices(fuels):
     """Print prices for 'yesterday', 'today', and 'tomorrow'
-       from the dictionary of fuel price data.
+       from the fuel price data.
        :param fuels: a List of fuel price data. Each element is
-                    a dict of info for a particular fuel type.
+                    a Fuel named tuple for a particular fuel type.
     """
-    # header line
-    print(f"{'Fuel Type':20} {'Yesterday':10} {'Today':10} {'Tomorrow':10}")
+    # header line, then one formatted line per fuel, written in one call
+    lines = [f"{'Fuel Type':20} {'Yesterday':10} {'Today':10} {'Tomorrow':10}"]
     for fuel in fuels:
-        fueltype = fuel['type']
-        yesterday = fuel['yesterday']
-        today = fuel['today']
-        tomorrow = fuel['tomorrow']
-        print(f"{fueltype:20} {yesterday:10} {today:10} {tomorrow:10}")
+        lines.append(f"{fuel.type:20} {fuel.yesterday:<10.2f} {fuel.today:<10.2f} {fuel.tomorrow:<10.2f}")
+    sys.stdout.write('\n'.join(lines) + '\n')
 
 
 if __name__ == '__main__':
@@ -133,7 +291,7 @@ if __name__ == '__main__':
     fuels = FuelPrice.get_fuel_prices()
     date = FuelPrice.get_date()
 
-    # print only Gasohol prices (comment out to include Diesel fuels)
-    #fuels = [fuel for fuel in fuels if 'Gasohol' in fuel['type']]
-    fuels = sorted(fuels, key=lambda fuel: fuel['type'])
+    # print only Gasohol prices (uncomment to exclude Diesel fuels)
+    #fuels = FuelPrice.get_gasohol_prices()
+    fuels.sort(key=attrgetter('type'))
     print_fuel_prices(date, fuels)